@@ -1,23 +1,31 @@
-import json
+import asyncio
+import hmac
+import logging
 import os
+import queue
+import re
 import time
-import threading
+import uuid
 from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
 from typing import Dict, Any, Optional
 
-import redis
-import requests
-import schedule
+from cachetools import TTLCache
+import httpx
+import orjson
+import redis.asyncio as aioredis
 from fastapi import FastAPI, HTTPException, Depends, Header, Query, Body
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, PrivateAttr, model_validator
 import uvicorn
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="Scheduler API", version="2.0.0")
+app = FastAPI(title="Scheduler API", version="2.0.0", default_response_class=ORJSONResponse)
 
 API_TOKEN = os.getenv('API_TOKEN')
+_API_TOKEN_B = API_TOKEN.encode() if API_TOKEN else b""
 
 # ==========================================
 # CONFIGURAÇÃO DE ROTA INTERNA DO N8N
@@ -32,39 +40,148 @@ WEBHOOK_MAX_RETRIES = int(os.getenv('WEBHOOK_MAX_RETRIES', 3))
 WEBHOOK_RETRY_DELAY = int(os.getenv('WEBHOOK_RETRY_DELAY', 10))  # segundos entre retries
 WEBHOOK_TIMEOUT = int(os.getenv('WEBHOOK_TIMEOUT', 30))
 
+# Tamanho máximo do payload serializado (bytes)
+MAX_PAYLOAD_BYTES = int(os.getenv('MAX_PAYLOAD_BYTES', 1_048_576))
+
 # Intervalo para varredura de mensagens atrasadas (segundos)
 SWEEP_INTERVAL = int(os.getenv('SWEEP_INTERVAL', 60))
 
-
-def log(msg: str):
-    """Log com timestamp padronizado."""
-    print(f"[{datetime.utcnow().isoformat()}] {msg}")
+# Quantidade de mensagens por pipeline nas operações em lote
+REDIS_PIPELINE_CHUNK = 1000
+
+# Quantidade de mensagens lidas por round-trip nas varreduras completas
+REDIS_FETCH_BATCH = 500
+
+# COUNT dos SCAN/ZSCAN: o filtro roda no Redis, então lotes maiores
+# significam menos round-trips por varredura
+SCAN_COUNT = 10000
+
+# Mensagens ficam no hash message:{id}. Índices para busca sem SCAN:
+# idx:messages (ZSET com score 0, ordenado por ID) atende 'prefix' via
+# ZRANGEBYLEX; idx:ngram:{trigrama} (SET de IDs) atende 'contains' via SINTER.
+IDX_MESSAGES = "idx:messages"
+NGRAM_SIZE = 3
+
+# Pool de conexões Redis (por processo)
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 32))
+REDIS_POOL_TIMEOUT = int(os.getenv('REDIS_POOL_TIMEOUT', 5))
+
+# Pool de conexões HTTP (keep-alive) para os disparos
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 500))
+WEBHOOK_MAX_KEEPALIVE = int(os.getenv('WEBHOOK_MAX_KEEPALIVE', 100))
+
+# Workers do uvicorn. Todos atendem HTTP; só o líder (eleito no Redis)
+# restaura, agenda e dispara as mensagens.
+UVICORN_WORKERS = int(os.getenv('UVICORN_WORKERS', 1))
+LEADER_KEY = "scheduler:leader"
+LEADER_TTL = int(os.getenv('LEADER_TTL', 15))  # segundos
+LEADER_HEARTBEAT = int(os.getenv('LEADER_HEARTBEAT', 5))  # segundos
+EVENTS_CHANNEL = "scheduler:events"
+# Marca a migração de formatos antigos como concluída (ver migrate_legacy_messages)
+MIGRATION_KEY = "scheduler:migrated"
+WORKER_ID = uuid.uuid4().hex
+
+
+# Logs saem por uma fila: os handlers só enfileiram o registro e a thread do
+# QueueListener formata e escreve no stdout, fora do caminho das requisições.
+logger = logging.getLogger("scheduler")
+logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+logger.propagate = False
+
+# O módulo é importado duas vezes no mesmo processo quando executado como
+# script (__main__ e scheduler_api, via uvicorn.run): só a primeira importação
+# cria o handler e a thread; as demais reaproveitam o listener já registrado.
+_log_queue_handler = next((h for h in logger.handlers if isinstance(h, QueueHandler)), None)
+if _log_queue_handler is None:
+    _log_queue: queue.Queue = queue.Queue(-1)
+    _log_formatter = logging.Formatter("[%(asctime)s] %(levelname)s %(message)s")
+    _log_formatter.converter = time.gmtime  # timestamps em UTC
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(_log_formatter)
+    _log_queue_handler = QueueHandler(_log_queue)
+    _log_queue_handler.listener = QueueListener(_log_queue, _log_handler)
+    _log_queue_handler.listener.start()
+    logger.addHandler(_log_queue_handler)
+_log_listener: QueueListener = _log_queue_handler.listener
 
 
 def verify_token(authorization: str = Header(None)):
     if not authorization:
         raise HTTPException(status_code=401, detail="Authorization header required")
 
-    if not authorization.startswith("Bearer "):
+    if len(authorization) < 8 or authorization[:7] != "Bearer ":
         raise HTTPException(status_code=401, detail="Invalid authorization format")
 
-    token = authorization.replace("Bearer ", "")
-    if token != API_TOKEN:
+    # Comparação em tempo constante
+    token = authorization[7:]
+    if not hmac.compare_digest(token.encode(), _API_TOKEN_B):
         raise HTTPException(status_code=401, detail="Invalid token")
 
     return token
 
 
-redis_client = redis.Redis(
+# Pool limitado de conexões: acima do limite, a requisição espera até
+# REDIS_POOL_TIMEOUT segundos por uma conexão livre em vez de abrir outra.
+# Teto de sockets no servidor = workers do uvicorn x REDIS_MAX_CONNECTIONS.
+redis_pool = aioredis.BlockingConnectionPool(
     host=os.getenv('REDIS_HOST', 'localhost'),
     port=int(os.getenv('REDIS_PORT', 6379)),
     password=os.getenv('REDIS_PASSWORD'),
-    decode_responses=True,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
     socket_connect_timeout=10,
     socket_timeout=10,
     retry_on_timeout=True,
 )
 
+# Cliente assíncrono: as rotas e os disparos rodam no event loop do uvicorn.
+# Sem decode_responses: valores chegam como bytes e vão direto para o orjson.
+redis_client = aioredis.Redis(connection_pool=redis_pool)
+
+# IDs por página da busca: cada página custa um round-trip de leitura dos hashes
+SEARCH_PAGE_SIZE = 500
+
+# Liderança: aquisição e renovação em um único comando atômico. Renova o TTL
+# só se a chave ainda for deste worker (GET + EXPIRE separados poderiam
+# estender a lease de outro worker que assumiu no intervalo).
+# KEYS[1] = scheduler:leader; ARGV = WORKER_ID, TTL. Retorno: 1 = líder.
+LEADER_SCRIPT = redis_client.register_script("""
+local current = redis.call('GET', KEYS[1])
+if not current then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return 1
+end
+if current == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+""")
+
+# Libera a liderança só se a chave ainda for deste worker
+RELEASE_SCRIPT = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+# Cliente HTTP compartilhado (definido no startup)
+_http: Optional[httpx.AsyncClient] = None
+
+# Cache local de GET /messages/{id}. Invalidado nas escritas deste processo;
+# nos demais workers o TTL curto limita a defasagem.
+GET_CACHE_TTL = float(os.getenv('GET_CACHE_TTL', 2))  # segundos
+_get_cache: TTLCache = TTLCache(maxsize=10_000, ttl=GET_CACHE_TTL)
+
+# Referências fortes às tasks de background (evita coleta pelo GC).
+# _leader_tasks só existem enquanto este worker for o líder.
+_background_tasks: set = set()
+_leader_tasks: set = set()
+_is_leader = False
+# Instante (time.monotonic) em que a lease atual expira no Redis
+_lease_expires = 0.0
+
 
 class ScheduleMessage(BaseModel):
     id: str
@@ -72,17 +189,34 @@ class ScheduleMessage(BaseModel):
     payload: Dict[str, Any]
     webhookUrl: str
 
+    # Payload já serializado na validação, reaproveitado na gravação
+    _payload_blob: bytes = PrivateAttr(default=b"")
+
+    @model_validator(mode="after")
+    def _check_payload_size(self):
+        try:
+            self._payload_blob = orjson.dumps(self.payload)
+        except orjson.JSONEncodeError as e:
+            # Ex.: inteiros acima de 64 bits. TypeError viraria 500; ValueError vira 422
+            raise ValueError(f"payload não serializável: {e}") from e
+        if len(self._payload_blob) > MAX_PAYLOAD_BYTES:
+            raise ValueError(f"payload excede o limite de {MAX_PAYLOAD_BYTES} bytes")
+        return self
+
 
 class BulkDeleteFilters(BaseModel):
     prefix: Optional[str] = None
     contains: Optional[str] = None
 
 
-# Controle de jobs em memória
-scheduled_jobs: Dict[str, schedule.Job] = {}
+# Controle de jobs em memória: dicionário por ID com
+# {ts, webhook_url, payload, handle}. Cada job é um timer do próprio event
+# loop (loop.call_later, um heap interno do asyncio): sem thread dedicada
+# e sem polling. Tudo que toca _jobs roda na thread do event loop.
+_jobs: Dict[str, Dict[str, Any]] = {}
 
-# Lock para acesso thread-safe ao scheduler
-schedule_lock = threading.RLock()
+# Referências fortes aos disparos em andamento (evita coleta pelo GC)
+_fire_tasks: set = set()
 
 
 def _rewrite_webhook_url(url: str) -> str:
@@ -102,39 +236,176 @@ def _rewrite_webhook_url(url: str) -> str:
     return url
 
 
-def _build_next_run_map() -> Dict[str, Optional[str]]:
-    next_run_map: Dict[str, Optional[str]] = {}
-    with schedule_lock:
-        for job in list(schedule.jobs):
-            try:
-                tag_id = list(job.tags)[0] if job.tags else None
-                if tag_id:
-                    next_run_map[tag_id] = job.next_run.isoformat() if job.next_run else None
-            except Exception:
-                pass
-    return next_run_map
+def _next_run_iso(job: Dict[str, Any]) -> str:
+    return datetime.fromtimestamp(job["ts"]).astimezone().isoformat()
+
+
+def _cancel_job(message_id: str) -> bool:
+    """Remove o job e cancela o timer, se ainda não disparou."""
+    job = _jobs.pop(message_id, None)
+    if job is None:
+        return False
+    if job["handle"] is not None:
+        job["handle"].cancel()
+    return True
+
+
+def _clear_jobs():
+    """Descarta todos os jobs em memória (ao perder a liderança)."""
+    for message_id in list(_jobs):
+        _cancel_job(message_id)
+
+
+def _glob_escape(value: str) -> str:
+    """Escapa os metacaracteres de glob do Redis (*, ?, [, ], \\) para MATCH literal."""
+    return re.sub(r'([\\*?\[\]])', r'\\\1', value)
+
+
+def _message_key(message_id: str) -> str:
+    return f"message:{message_id}"
+
+
+def _ngrams(value: str) -> set:
+    return {value[i:i + NGRAM_SIZE] for i in range(len(value) - NGRAM_SIZE + 1)}
+
+
+def _parse_schedule_ts(schedule_to: str) -> float:
+    """Converte scheduleTo (ISO 8601, aceita 'Z') para epoch em segundos."""
+    return datetime.fromisoformat(schedule_to.replace('Z', '+00:00')).timestamp()
+
 
+def _encode_message(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Converte a mensagem para os campos do hash (payload serializado, se ainda não estiver)."""
+    payload = data["payload"]
+    schedule_ts = data.get("scheduleTs")
+    fields = {
+        "id": data["id"],
+        "scheduleTo": data["scheduleTo"],
+        "scheduleTs": schedule_ts if schedule_ts is not None else _parse_schedule_ts(data["scheduleTo"]),
+        "payload": payload if isinstance(payload, bytes) else orjson.dumps(payload),
+        "webhookUrl": data["webhookUrl"],
+    }
+    for field in ("_failCount", "_lastError", "_lastFailure"):
+        if data.get(field) is not None:
+            fields[field] = data[field]
+    return fields
 
-def _iter_message_keys_by_filter(prefix: Optional[str] = None, contains: Optional[str] = None):
+
+def _decode_message(fields: Dict[bytes, bytes]) -> Dict[str, Any]:
+    """Converte o hash message:{id} (bytes) para o formato da API."""
+    data: Dict[str, Any] = {k.decode(): v.decode() for k, v in fields.items() if k != b"payload"}
+    data["payload"] = orjson.loads(fields[b"payload"])
+    if "_failCount" in data:
+        data["_failCount"] = int(data["_failCount"])
+    # Hashes gravados antes do campo scheduleTs: calcula a partir do ISO
+    if "scheduleTs" in data:
+        data["scheduleTs"] = float(data["scheduleTs"])
+    else:
+        data["scheduleTs"] = _parse_schedule_ts(data["scheduleTo"])
+    return data
+
+
+def _store_message(pipe, data: Dict[str, Any]):
+    """Grava (upsert) o hash da mensagem e indexa o ID, no pipeline informado."""
+    message_id = data["id"]
+    redis_key = _message_key(message_id)
+    pipe.delete(redis_key)
+    pipe.hset(redis_key, mapping=_encode_message(data))
+    pipe.zadd(IDX_MESSAGES, {message_id: 0})
+    for gram in _ngrams(message_id):
+        pipe.sadd(f"idx:ngram:{gram}", message_id)
+
+
+def _delete_messages(pipe, message_ids: list):
+    """
+    Remove os hashes das mensagens e os IDs de todos os índices, no pipeline
+    informado. UNLINK libera a memória em background no Redis, e cada índice
+    recebe um único ZREM/SREM com todos os IDs do lote.
+    """
+    if not message_ids:
+        return
+    pipe.unlink(*[_message_key(message_id) for message_id in message_ids])
+    pipe.zrem(IDX_MESSAGES, *message_ids)
+
+    ids_by_gram: Dict[str, list] = {}
+    for message_id in message_ids:
+        for gram in _ngrams(message_id):
+            ids_by_gram.setdefault(gram, []).append(message_id)
+    for gram, members in ids_by_gram.items():
+        pipe.srem(f"idx:ngram:{gram}", *members)
+
+
+async def _find_message_ids(prefix: Optional[str] = None, contains: Optional[str] = None) -> list:
     if not prefix and not contains:
         raise HTTPException(status_code=400, detail="Informe ao menos um filtro: 'prefix' ou 'contains'.")
 
     if prefix:
-        pattern = f"message:{prefix}*"
-        for key in redis_client.scan_iter(match=pattern, count=1000):
-            yield key
-        return
-
-    for key in redis_client.scan_iter(match="message:*", count=1000):
-        try:
-            msg_id = key.split("message:", 1)[1]
-            if contains and (contains in msg_id):
-                yield key
-        except Exception:
-            pass
+        # Faixa lexicográfica [prefix, prefix + 0xff] no índice ordenado
+        start = b"[" + prefix.encode()
+        ids = await redis_client.zrangebylex(IDX_MESSAGES, start, start + b"\xff")
+        return [message_id.decode() for message_id in ids]
+
+    grams = _ngrams(contains)
+    if grams:
+        # Candidatos que contêm todos os trigramas do filtro
+        candidates = await redis_client.sinter([f"idx:ngram:{gram}" for gram in grams])
+    else:
+        # Filtro menor que um trigrama: varre apenas o índice de IDs
+        pattern = f"*{_glob_escape(contains)}*"
+        candidates = [member async for member, _ in redis_client.zscan_iter(IDX_MESSAGES, match=pattern, count=SCAN_COUNT)]
+
+    # Trigramas em comum não garantem a substring contígua: confirma no ID
+    return sorted(message_id for message_id in (c.decode() for c in candidates) if contains in message_id)
+
+
+async def _fetch_messages(message_ids: list):
+    """Lê os hashes de um lote de IDs em um único round-trip."""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for message_id in message_ids:
+            pipe.hgetall(_message_key(message_id))
+        values = await pipe.execute()
+    return [(message_id, fields) for message_id, fields in zip(message_ids, values) if fields]
+
+
+async def _iter_messages():
+    """
+    Percorre todas as mensagens pelo índice (ZSCAN), sem SCAN no keyspace.
+    Os hashes são lidos em lotes de REDIS_FETCH_BATCH por round-trip.
+    """
+    batch = []
+    async for member, _ in redis_client.zscan_iter(IDX_MESSAGES, count=SCAN_COUNT):
+        batch.append(member.decode())
+        if len(batch) >= REDIS_FETCH_BATCH:
+            for item in await _fetch_messages(batch):
+                yield item
+            batch = []
+    if batch:
+        for item in await _fetch_messages(batch):
+            yield item
+
+
+async def _mark_failure(message_id: str, last_error: Optional[str], count: bool):
+    """
+    Marca no Redis que houve falha (para diagnóstico e rate-limit), mas NÃO
+    deleta. count=True incrementa _failCount (uma vez por disparo).
+    """
+    try:
+        redis_key = _message_key(message_id)
+        if await redis_client.exists(redis_key):
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.hset(redis_key, mapping={
+                    "_lastFailure": datetime.utcnow().isoformat(),
+                    "_lastError": str(last_error),
+                })
+                if count:
+                    pipe.hincrby(redis_key, "_failCount", 1)
+                await pipe.execute()
+            _get_cache.pop(message_id, None)
+    except Exception:
+        pass
 
 
-def fire_webhook(message_id: str, webhook_url: str, payload: Dict[str, Any]):
+async def fire_webhook(message_id: str, webhook_url: str, payload: Dict[str, Any]):
     """
     Dispara o webhook com retry e backoff.
     SÓ limpa do Redis se o disparo for bem-sucedido.
@@ -142,147 +413,149 @@ def fire_webhook(message_id: str, webhook_url: str, payload: Dict[str, Any]):
     # Reescreve URL para rota interna
     internal_url = _rewrite_webhook_url(webhook_url)
     if internal_url != webhook_url:
-        log(f"URL rewritten for {message_id}: {webhook_url} -> {internal_url}")
+        logger.info("URL rewritten for %s: %s -> %s", message_id, webhook_url, internal_url)
+
+    # Serializa uma única vez (orjson) e reaproveita o corpo nas tentativas
+    body = orjson.dumps(payload)
 
     last_error = None
+    attempts = 0
     for attempt in range(1, WEBHOOK_MAX_RETRIES + 1):
+        # Fora da liderança o disparo passa a ser do novo líder: não tenta de novo
+        if not _is_leader:
+            logger.warning("Worker is no longer leader, stopping delivery of %s", message_id)
+            if last_error is None:
+                return
+            break
+
+        attempts = attempt
         try:
-            response = requests.post(internal_url, json=payload, timeout=WEBHOOK_TIMEOUT)
+            response = await _http.post(internal_url, content=body)
             response.raise_for_status()
-            log(f"Webhook fired successfully for message {message_id} (attempt {attempt})")
+            logger.info("Webhook fired successfully for message %s (attempt %s)", message_id, attempt)
 
             # SUCESSO — agora sim limpa do Redis e da memória
             try:
-                redis_client.delete(f"message:{message_id}")
-                log(f"Message {message_id} cleaned from Redis")
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    _delete_messages(pipe, [message_id])
+                    await pipe.execute()
+                _get_cache.pop(message_id, None)
+                logger.info("Message %s cleaned from Redis", message_id)
             except Exception as redis_err:
-                log(f"WARNING: Webhook fired but failed to clean Redis for {message_id}: {redis_err}")
+                logger.warning("Webhook fired but failed to clean Redis for %s: %s", message_id, redis_err)
 
-            with schedule_lock:
-                scheduled_jobs.pop(message_id, None)
-                try:
-                    schedule.clear(message_id)
-                except Exception:
-                    pass
+            _cancel_job(message_id)
 
             return  # Sucesso, sai da função
 
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             last_error = f"Timeout (attempt {attempt}/{WEBHOOK_MAX_RETRIES})"
-            log(f"Webhook timeout for {message_id}: {last_error}")
-        except requests.exceptions.ConnectionError as e:
+            logger.warning("Webhook timeout for %s: %s", message_id, last_error)
+        except httpx.TransportError as e:
             last_error = f"ConnectionError (attempt {attempt}/{WEBHOOK_MAX_RETRIES}): {e}"
-            log(f"Webhook connection error for {message_id}: {last_error}")
-        except requests.exceptions.HTTPError as e:
+            logger.warning("Webhook connection error for %s: %s", message_id, last_error)
+        except httpx.HTTPStatusError as e:
             last_error = f"HTTP {e.response.status_code} (attempt {attempt}/{WEBHOOK_MAX_RETRIES})"
-            log(f"Webhook HTTP error for {message_id}: {last_error}")
+            logger.warning("Webhook HTTP error for %s: %s", message_id, last_error)
             # Se for 4xx (erro do cliente), não faz retry
             if e.response.status_code < 500:
-                log(f"Client error {e.response.status_code} for {message_id}, skipping retries")
+                logger.warning("Client error %s for %s, skipping retries", e.response.status_code, message_id)
                 break
         except Exception as e:
             last_error = f"Unexpected error (attempt {attempt}/{WEBHOOK_MAX_RETRIES}): {e}"
-            log(f"Webhook unexpected error for {message_id}: {last_error}")
+            logger.warning("Webhook unexpected error for %s: %s", message_id, last_error)
 
         # Espera antes do próximo retry (exceto no último)
         if attempt < WEBHOOK_MAX_RETRIES:
+            # _lastFailure já vale durante o backoff: se a liderança mudar, a
+            # restauração do novo líder respeita o rate-limit do sweep
+            await _mark_failure(message_id, last_error, count=False)
             delay = WEBHOOK_RETRY_DELAY * attempt  # backoff linear: 10s, 20s, 30s
-            log(f"Retrying {message_id} in {delay}s...")
-            time.sleep(delay)
+            logger.warning("Retrying %s in %ss...", message_id, delay)
+            await asyncio.sleep(delay)
 
     # TODAS AS TENTATIVAS FALHARAM
-    log(f"ALL {WEBHOOK_MAX_RETRIES} attempts FAILED for {message_id}. Last error: {last_error}")
-    log(f"Message {message_id} KEPT in Redis for retry on next sweep")
+    logger.error("ALL %s attempts FAILED for %s. Last error: %s", attempts, message_id, last_error)
+    logger.warning("Message %s KEPT in Redis for retry on next sweep", message_id)
 
-    # Marca no Redis que houve falha (para diagnóstico), mas NÃO deleta
-    try:
-        raw = redis_client.get(f"message:{message_id}")
-        if raw:
-            data = json.loads(raw)
-            data["_lastFailure"] = datetime.utcnow().isoformat()
-            data["_lastError"] = str(last_error)
-            data["_failCount"] = data.get("_failCount", 0) + 1
-            redis_client.set(f"message:{message_id}", json.dumps(data))
-    except Exception:
-        pass
+    await _mark_failure(message_id, last_error, count=True)
 
     # Limpa o job em memória (será re-criado pelo sweep)
-    with schedule_lock:
-        scheduled_jobs.pop(message_id, None)
-        try:
-            schedule.clear(message_id)
-        except Exception:
-            pass
+    _cancel_job(message_id)
 
 
-def schedule_message(message_id: str, schedule_timestamp: str, webhook_url: str, payload: Dict[str, Any]):
-    """
-    Agenda um job para executar exatamente em 'schedule_timestamp'.
-    """
-    with schedule_lock:
-        # Cancela job anterior se existir
-        if message_id in scheduled_jobs:
-            schedule.clear(message_id)
-            scheduled_jobs.pop(message_id, None)
-
-        # Aceita ISO 8601 com 'Z'
-        schedule_time = datetime.fromisoformat(schedule_timestamp.replace('Z', '+00:00'))
-        now = datetime.now(schedule_time.tzinfo)
-
-        if schedule_time <= now:
-            # Executa imediatamente (em thread separada para não bloquear)
-            log(f"Message {message_id} is in the past ({schedule_timestamp}), firing immediately")
-            t = threading.Thread(
-                target=fire_webhook,
-                args=(message_id, webhook_url, payload),
-                daemon=True
-            )
-            t.start()
-            return
+def _dispatch_fire(message_id: str, webhook_url: str, payload: Dict[str, Any]):
+    """Dispara o webhook como task no event loop."""
+    task = asyncio.create_task(fire_webhook(message_id, webhook_url, payload))
+    _fire_tasks.add(task)
+    task.add_done_callback(_fire_tasks.discard)
+
+
+def _fire_job(message_id: str, job: Dict[str, Any]):
+    """Callback do timer: dispara se o job ainda for o agendamento vigente."""
+    if _jobs.get(message_id) is not job:
+        return
+    # O job continua em _jobs até o fire_webhook concluir (o sweep não o duplica)
+    job["handle"] = None
+    _dispatch_fire(message_id, job["webhook_url"], job["payload"])
 
-        # Converte para horário LOCAL como datetime "naive" (schedule usa localtime)
-        local_dt = schedule_time.astimezone().replace(tzinfo=None)
 
-        def job():
-            fire_webhook(message_id, webhook_url, payload)
-            return schedule.CancelJob
+def schedule_message(message_id: str, ts: float, webhook_url: str, payload: Dict[str, Any]):
+    """
+    Agenda um job para executar exatamente em 'ts' (epoch em segundos).
+    Deve ser chamado na thread do event loop.
+    """
+    # Cancela job anterior se existir
+    _cancel_job(message_id)
+
+    delay = ts - time.time()
+    if delay <= 0:
+        # Executa imediatamente (como task, para não bloquear)
+        logger.info("Message %s is in the past (%s), firing immediately", message_id, datetime.fromtimestamp(ts).astimezone().isoformat())
+        _dispatch_fire(message_id, webhook_url, payload)
+        return
 
-        job_instance = schedule.every().day.at(local_dt.strftime("%H:%M:%S")).do(job).tag(message_id)
-        job_instance.next_run = local_dt
+    job = {"ts": ts, "webhook_url": webhook_url, "payload": payload, "handle": None}
+    job["handle"] = asyncio.get_running_loop().call_later(delay, _fire_job, message_id, job)
+    _jobs[message_id] = job
 
-        scheduled_jobs[message_id] = job_instance
-        log(f"Message {message_id} scheduled for {local_dt.isoformat()} (local time)")
+    logger.info("Message %s scheduled for %s (local time)", message_id, _next_run_iso(job))
 
 
-def scheduler_worker():
-    """Thread que executa os jobs pendentes a cada 1 segundo."""
-    while True:
+def _can_refire(data: Dict[str, Any], now: datetime) -> bool:
+    """
+    Política de re-disparo de mensagens atrasadas (sweep e restauração):
+    espera 5 min desde a última falha e desiste após 10 falhas.
+    """
+    # Verifica rate-limit: não re-disparar se falhou há menos de 5 min
+    last_failure = data.get("_lastFailure")
+    if last_failure:
         try:
-            with schedule_lock:
-                schedule.run_pending()
-        except Exception as e:
-            log(f"Error in scheduler_worker: {e}")
-        time.sleep(1)
+            last_fail_time = datetime.fromisoformat(last_failure)
+            if (now - last_fail_time).total_seconds() < 300:
+                return False  # Espera mais antes de tentar de novo
+        except Exception:
+            pass
+
+    # Muitas falhas, não tenta mais
+    return data.get("_failCount", 0) < 10
 
 
-def sweep_failed_messages():
+async def sweep_failed_messages():
     """
     Varredura periódica: busca mensagens no Redis cujo scheduleTo já passou
     e que não têm job em memória (falha anterior). Re-dispara imediatamente.
     """
     while True:
         try:
-            time.sleep(SWEEP_INTERVAL)
+            await asyncio.sleep(SWEEP_INTERVAL)
             now = datetime.utcnow()
+            now_ts = time.time()
             swept = 0
 
-            for key in redis_client.scan_iter(match="message:*", count=1000):
+            async for index_id, fields in _iter_messages():
                 try:
-                    raw = redis_client.get(key)
-                    if not raw:
-                        continue
-
-                    data = json.loads(raw)
+                    data = _decode_message(fields)
                     msg_id = data.get("id")
                     schedule_to = data.get("scheduleTo")
 
@@ -290,95 +563,262 @@ def sweep_failed_messages():
                         continue
 
                     # Verifica se já passou do horário
-                    schedule_time = datetime.fromisoformat(schedule_to.replace('Z', '+00:00'))
-                    schedule_utc = schedule_time.astimezone().replace(tzinfo=None)
-
-                    if schedule_utc > now:
+                    if data["scheduleTs"] > now_ts:
                         # Ainda no futuro — verifica se tem job em memória
-                        with schedule_lock:
-                            if msg_id not in scheduled_jobs:
-                                # Perdeu o job, re-agenda
-                                log(f"[SWEEP] Re-scheduling future message {msg_id} (scheduleTo: {schedule_to})")
-                                schedule_message(msg_id, schedule_to, data["webhookUrl"], data["payload"])
+                        has_job = msg_id in _jobs
+                        if not has_job:
+                            # Perdeu o job, re-agenda
+                            logger.info("[SWEEP] Re-scheduling future message %s (scheduleTo: %s)", msg_id, schedule_to)
+                            schedule_message(msg_id, data["scheduleTs"], data["webhookUrl"], data["payload"])
                         continue
 
                     # Já passou do horário — verifica se tem job ativo
-                    with schedule_lock:
-                        has_job = msg_id in scheduled_jobs
+                    has_job = msg_id in _jobs
 
                     if not has_job:
-                        # Verifica rate-limit: não re-disparar se falhou há menos de 5 min
-                        last_failure = data.get("_lastFailure")
-                        if last_failure:
-                            try:
-                                last_fail_time = datetime.fromisoformat(last_failure)
-                                if (now - last_fail_time).total_seconds() < 300:
-                                    continue  # Espera mais antes de tentar de novo
-                            except Exception:
-                                pass
-
-                        fail_count = data.get("_failCount", 0)
-                        if fail_count >= 10:
-                            # Muitas falhas, loga mas não tenta mais
+                        if not _can_refire(data, now):
                             continue
 
-                        log(f"[SWEEP] Firing overdue message {msg_id} (scheduleTo: {schedule_to}, failCount: {fail_count})")
+                        fail_count = data.get("_failCount", 0)
+                        logger.warning("[SWEEP] Firing overdue message %s (scheduleTo: %s, failCount: %s)", msg_id, schedule_to, fail_count)
                         swept += 1
-                        t = threading.Thread(
-                            target=fire_webhook,
-                            args=(msg_id, data["webhookUrl"], data["payload"]),
-                            daemon=True
-                        )
-                        t.start()
+                        _dispatch_fire(msg_id, data["webhookUrl"], data["payload"])
 
                 except Exception as e:
-                    log(f"[SWEEP] Error processing {key}: {e}")
+                    logger.error("[SWEEP] Error processing %s: %s", index_id, e)
 
             if swept > 0:
-                log(f"[SWEEP] Fired {swept} overdue messages")
+                logger.info("[SWEEP] Fired %s overdue messages", swept)
 
         except Exception as e:
-            log(f"[SWEEP] Error in sweep loop: {e}")
+            logger.error("[SWEEP] Error in sweep loop: %s", e)
+
+
+async def migrate_legacy_messages():
+    """
+    Converte mensagens no formato antigo (JSON em string) para hash + índices.
+    Roda uma única vez: ao concluir grava MIGRATION_KEY e as próximas trocas
+    de líder não varrem mais o keyspace.
+    """
+    if await redis_client.exists(MIGRATION_KEY):
+        return
+
+    async def migrate(keys: list) -> int:
+        # MGET do lote inteiro e regravação em um único MULTI/EXEC. Cada
+        # registro é convertido antes do MULTI: um JSON inválido (sem payload,
+        # scheduleTo ilegível...) é registrado e pulado sem travar o lote.
+        # O WATCH aborta o lote se outro worker regravar alguma chave entre o
+        # MGET e o EXEC; na releitura, chaves que já viraram hash voltam vazias.
+        async with redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(*keys)
+                    messages = []
+                    for key, raw in zip(keys, await pipe.mget(keys)):
+                        try:
+                            if not raw:
+                                continue
+                            data = orjson.loads(raw)
+                            if not all(isinstance(data.get(field), str) for field in ("id", "scheduleTo", "webhookUrl")):
+                                raise ValueError("id, scheduleTo e webhookUrl devem ser strings")
+                            messages.append(_encode_message(data))
+                        except Exception as e:
+                            logger.error("Failed to migrate message %s: %s", key.decode(), e)
+                    pipe.multi()
+                    for fields in messages:
+                        # _store_message apaga a string antes do HSET na mesma chave
+                        _store_message(pipe, fields)
+                    await pipe.execute()
+                    return len(messages)
+                except aioredis.WatchError:
+                    continue
+
+    try:
+        migrated_count = 0
+        batch = []
+        async for key in redis_client.scan_iter(match="message:*", count=SCAN_COUNT, _type="STRING"):
+            batch.append(key)
+            if len(batch) >= REDIS_FETCH_BATCH:
+                migrated_count += await migrate(batch)
+                batch = []
+        if batch:
+            migrated_count += await migrate(batch)
+        await redis_client.set(MIGRATION_KEY, 1)
+        if migrated_count:
+            logger.info("Migrated %s legacy messages to hashes", migrated_count)
+    except Exception as e:
+        logger.error("Error migrating legacy messages: %s", e)
 
 
-def restore_scheduled_messages():
-    """Restaura jobs a partir do Redis usando SCAN."""
+async def restore_scheduled_messages():
+    """Restaura jobs a partir do Redis percorrendo o índice de mensagens."""
     try:
         restored_count = 0
-        for key in redis_client.scan_iter(match="message:*", count=1000):
+        now = datetime.utcnow()
+        now_ts = time.time()
+        async for index_id, fields in _iter_messages():
             try:
-                raw = redis_client.get(key)
-                if not raw:
+                data = _decode_message(fields)
+                # Atrasadas seguem a mesma política do sweep: uma troca de
+                # líder não pode re-disparar na hora o que acabou de falhar
+                if data["scheduleTs"] <= now_ts and not _can_refire(data, now):
                     continue
-                data = json.loads(raw)
                 schedule_message(
                     data["id"],
-                    data["scheduleTo"],
+                    data["scheduleTs"],
                     data["webhookUrl"],
                     data["payload"],
                 )
                 restored_count += 1
-                log(f"Restored scheduled message - ID: {data['id']}")
+                logger.info("Restored scheduled message - ID: %s", data['id'])
             except Exception as e:
-                log(f"Failed to restore message {key}: {e}")
-        log(f"Restored {restored_count} scheduled messages from Redis")
+                logger.error("Failed to restore message %s: %s", index_id, e)
+        logger.info("Restored %s scheduled messages from Redis", restored_count)
     except Exception as e:
-        log(f"Error restoring messages: {e}")
+        logger.error("Error restoring messages: %s", e)
+
+
+async def listen_events():
+    """
+    Escuta o canal de eventos (somente no líder): 'new:<id>' agenda a mensagem
+    persistida no Redis e 'del:<id>' cancela o job em memória.
+    """
+    pubsub = redis_client.pubsub()
+    await pubsub.subscribe(EVENTS_CHANNEL)
+    try:
+        while True:
+            try:
+                event = await pubsub.get_message(ignore_subscribe_messages=True, timeout=LEADER_HEARTBEAT)
+                if not event:
+                    continue
+
+                action, _, message_id = event["data"].decode().partition(":")
+                if action == "new":
+                    fields = await redis_client.hgetall(_message_key(message_id))
+                    if not fields:
+                        continue
+                    data = _decode_message(fields)
+                    schedule_message(data["id"], data["scheduleTs"], data["webhookUrl"], data["payload"])
+                elif action == "del":
+                    _cancel_job(message_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("[EVENTS] Error handling event: %s", e)
+                await asyncio.sleep(1)
+    finally:
+        await pubsub.unsubscribe(EVENTS_CHANNEL)
+        await pubsub.close()
+
+
+async def load_messages():
+    """Migra formatos antigos e restaura os jobs (task do líder)."""
+    await migrate_legacy_messages()
+    await restore_scheduled_messages()
+
+
+def _become_leader():
+    global _is_leader
+    _is_leader = True
+    logger.info("Worker %s became scheduler leader", WORKER_ID)
+
+    # Assina os eventos antes de restaurar para não perder nada no intervalo.
+    # Migração e restauração rodam em task própria: o heartbeat segue
+    # renovando a lease enquanto elas percorrem o Redis.
+    _leader_tasks.add(asyncio.create_task(listen_events()))
+    _leader_tasks.add(asyncio.create_task(load_messages()))
+
+    # Task de varredura (recupera mensagens que falharam)
+    _leader_tasks.add(asyncio.create_task(sweep_failed_messages()))
+
+
+def _step_down():
+    global _is_leader
+    _is_leader = False
+    logger.info("Worker %s lost scheduler leadership", WORKER_ID)
+
+    for task in _leader_tasks:
+        task.cancel()
+    _leader_tasks.clear()
+    _clear_jobs()
+
+
+async def leader_election():
+    """
+    Heartbeat de liderança: adquire ou renova scheduler:leader (LEADER_SCRIPT).
+    Quem já é líder renova o TTL; os demais workers apenas atendem HTTP.
+    Se a renovação não for confirmada a tempo, o líder deixa a liderança
+    antes de a lease expirar, para que dois workers nunca disparem juntos.
+    """
+    global _lease_expires
+    while True:
+        # Marcado antes do envio: a lease no Redis nunca dura menos que isso
+        started = time.monotonic()
+        try:
+            acquired = await asyncio.wait_for(
+                LEADER_SCRIPT(keys=[LEADER_KEY], args=[WORKER_ID, LEADER_TTL]),
+                timeout=LEADER_HEARTBEAT,
+            )
+            if acquired:
+                _lease_expires = started + LEADER_TTL
+
+            if acquired and not _is_leader:
+                _become_leader()
+            elif not acquired and _is_leader:
+                _step_down()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("[LEADER] Error in leader election: %s: %s", type(e).__name__, e)
+
+        # Sem renovação até o próximo heartbeat a lease expira e outro worker
+        # pode assumir: deixa a liderança antes disso
+        if _is_leader and time.monotonic() + LEADER_HEARTBEAT >= _lease_expires:
+            logger.warning("[LEADER] Lease not renewed in time, stepping down")
+            _step_down()
+
+        await asyncio.sleep(LEADER_HEARTBEAT)
 
 
 @app.on_event("startup")
-def _startup():
-    restore_scheduled_messages()
+async def _startup():
+    global _http
+
+    # Disparos rodam como corrotinas no loop do uvicorn, com conexões reutilizadas
+    _http = httpx.AsyncClient(
+        timeout=WEBHOOK_TIMEOUT,
+        headers={"Content-Type": "application/json"},
+        limits=httpx.Limits(
+            max_keepalive_connections=WEBHOOK_MAX_KEEPALIVE,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        ),
+    )
 
-    # Thread do scheduler (executa jobs agendados)
-    t1 = threading.Thread(target=scheduler_worker, daemon=True)
-    t1.start()
+    # Eleição de líder: só o líder restaura, agenda e varre as mensagens
+    _background_tasks.add(asyncio.create_task(leader_election()))
 
-    # Thread de varredura (recupera mensagens que falharam)
-    t2 = threading.Thread(target=sweep_failed_messages, daemon=True)
-    t2.start()
+    logger.info("Scheduler API worker %s started with retry support and sweep worker", WORKER_ID)
 
-    log("Scheduler API started with retry support and sweep worker")
+
+@app.on_event("shutdown")
+async def _shutdown():
+    for task in _background_tasks | _leader_tasks:
+        task.cancel()
+
+    # Libera a liderança para outro worker assumir sem esperar o TTL
+    try:
+        if _is_leader:
+            await RELEASE_SCRIPT(keys=[LEADER_KEY], args=[WORKER_ID])
+    except Exception as e:
+        logger.error("Failed to release leadership: %s", e)
+
+    if _http is not None:
+        await _http.aclose()
+    await redis_client.close()
+    await redis_pool.disconnect()
+
+    # Esvazia a fila de logs antes de encerrar
+    _log_listener.stop()
 
 
 # =======================
@@ -388,90 +828,129 @@ def _startup():
 @app.post("/messages")
 async def create_scheduled_message(message: ScheduleMessage, token: str = Depends(verify_token)):
     try:
-        redis_key = f"message:{message.id}"
-
-        if redis_client.exists(redis_key):
-            log(f"Message exists, updating - ID: {message.id}")
-        else:
-            log(f"Creating new message - ID: {message.id}")
-
+        # Único parse do ISO 8601: os demais caminhos leem scheduleTs
         message_data = {
             "id": message.id,
             "scheduleTo": message.scheduleTo,
-            "payload": message.payload,
+            "scheduleTs": _parse_schedule_ts(message.scheduleTo),
+            "payload": message._payload_blob,
             "webhookUrl": message.webhookUrl
         }
 
-        redis_client.set(redis_key, json.dumps(message_data))
-        log(f"Message stored in Redis - ID: {message.id}")
-
-        schedule_message(message.id, message.scheduleTo, message.webhookUrl, message.payload)
+        # Hash, índices e evento em um único MULTI/EXEC.
+        # O líder agenda a mensagem ao receber o evento.
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.exists(_message_key(message.id))
+            _store_message(pipe, message_data)
+            pipe.publish(EVENTS_CHANNEL, f"new:{message.id}")
+            existed = (await pipe.execute())[0]
+        _get_cache.pop(message.id, None)
+
+        if existed:
+            logger.info("Message exists, updated - ID: %s", message.id)
+        else:
+            logger.info("Created new message - ID: %s", message.id)
+        logger.info("Message stored in Redis - ID: %s", message.id)
 
         return {"status": "scheduled", "messageId": message.id}
 
     except Exception as e:
-        log(f"Error in create: {type(e).__name__}: {str(e)}")
+        logger.error("Error in create: %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Failed to schedule message: {str(e)}")
 
 
 @app.get("/messages")
 async def list_scheduled_messages(token: str = Depends(verify_token)):
     try:
-        with schedule_lock:
-            jobs_snapshot = list(schedule.jobs)
-
-        jobs = []
-        for job in jobs_snapshot:
-            jobs.append({
-                "messageId": list(job.tags)[0] if job.tags else "unknown",
-                "nextRun": job.next_run.isoformat() if job.next_run else None,
-                "job": str(job.job_func)
-            })
+        jobs = [
+            {
+                "messageId": msg_id,
+                "nextRun": _next_run_iso(job),
+                "webhookUrl": job["webhook_url"],
+            }
+            for msg_id, job in _jobs.items()
+        ]
 
         return {"scheduledJobs": jobs, "count": len(jobs)}
 
     except Exception as e:
-        log(f"Error listing jobs: {type(e).__name__}: {str(e)}")
+        logger.error("Error listing jobs: %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Failed to list jobs: {str(e)}")
 
 
+async def _search_pages(prefix: Optional[str], contains: Optional[str]):
+    """Gera os IDs da busca em páginas de até SEARCH_PAGE_SIZE, ordenados por ID."""
+    if prefix:
+        # Paginação por chave no índice ordenado: cada página parte do último ID visto
+        low = b"[" + prefix.encode()
+        high = low + b"\xff"
+        while True:
+            ids = await redis_client.zrangebylex(IDX_MESSAGES, low, high, start=0, num=SEARCH_PAGE_SIZE)
+            if ids:
+                yield [message_id.decode() for message_id in ids]
+            if len(ids) < SEARCH_PAGE_SIZE:
+                return
+            low = b"(" + ids[-1]
+    else:
+        # Interseção dos trigramas calculada uma única vez por requisição
+        message_ids = await _find_message_ids(contains=contains)
+        for i in range(0, len(message_ids), SEARCH_PAGE_SIZE):
+            yield message_ids[i:i + SEARCH_PAGE_SIZE]
+
+
+async def _stream_search(rows: list, pages):
+    """Gera o resultado da busca em NDJSON a partir da primeira página já lida."""
+    try:
+        while True:
+            for index_id, fields in rows:
+                try:
+                    data = _decode_message(fields)
+                    msg_id = data.get("id") or index_id
+                    job = _jobs.get(msg_id)
+                    yield orjson.dumps({
+                        "id": msg_id,
+                        "scheduleTo": data.get("scheduleTo"),
+                        "payload": data.get("payload"),
+                        "webhookUrl": data.get("webhookUrl"),
+                        "nextRun": _next_run_iso(job) if job else None,
+                        "_failCount": data.get("_failCount"),
+                        "_lastError": data.get("_lastError"),
+                        "_lastFailure": data.get("_lastFailure"),
+                    }) + b"\n"
+                except Exception as e:
+                    logger.error("Failed to parse message %s: %s", index_id, e)
+
+            message_ids = await anext(pages, None)
+            if message_ids is None:
+                return
+            rows = await _fetch_messages(message_ids)
+    except Exception as e:
+        # O status 200 já foi enviado: só resta registrar e encerrar o stream
+        logger.error("Error in search_messages: %s: %s", type(e).__name__, e)
+
+
 @app.get("/messages/search")
 async def search_messages(
     prefix: Optional[str] = Query(default=None),
     contains: Optional[str] = Query(default=None),
     token: str = Depends(verify_token),
 ):
-    try:
-        next_run_map = _build_next_run_map()
-        results = []
-
-        for key in _iter_message_keys_by_filter(prefix=prefix, contains=contains):
-            raw = redis_client.get(key)
-            if not raw:
-                continue
-            try:
-                data = json.loads(raw)
-                msg_id = data.get("id") or key.split("message:", 1)[1]
-                results.append({
-                    "id": msg_id,
-                    "scheduleTo": data.get("scheduleTo"),
-                    "payload": data.get("payload"),
-                    "webhookUrl": data.get("webhookUrl"),
-                    "nextRun": next_run_map.get(msg_id),
-                    "_failCount": data.get("_failCount"),
-                    "_lastError": data.get("_lastError"),
-                    "_lastFailure": data.get("_lastFailure"),
-                })
-            except Exception as e:
-                log(f"Failed to parse message {key}: {e}")
+    if not prefix and not contains:
+        raise HTTPException(status_code=400, detail="Informe ao menos um filtro: 'prefix' ou 'contains'.")
 
-        return {"count": len(results), "messages": results}
-    except HTTPException:
-        raise
+    # Resolve os IDs e lê a primeira página antes de enviar o status: falhas
+    # no Redis ainda respondem 500 em vez de um stream vazio
+    pages = _search_pages(prefix, contains)
+    try:
+        message_ids = await anext(pages, None)
+        rows = await _fetch_messages(message_ids) if message_ids else []
     except Exception as e:
-        log(f"Error in search_messages: {type(e).__name__}: {str(e)}")
+        logger.error("Error in search_messages: %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Failed to search messages: {str(e)}")
 
+    # Uma mensagem por linha, enviada à medida que as páginas chegam do Redis
+    return StreamingResponse(_stream_search(rows, pages), media_type="application/x-ndjson")
+
 
 @app.delete("/messages/bulk")
 @app.delete("/messages/bulk/")
@@ -490,80 +969,81 @@ async def bulk_delete_messages(
         if not prefix and not contains:
             raise HTTPException(status_code=400, detail="Informe ao menos um filtro: 'prefix' ou 'contains'.")
 
-        deleted_ids = []
-        for key in list(_iter_message_keys_by_filter(prefix=prefix, contains=contains)):
-            try:
-                message_id = key.split("message:", 1)[1]
-            except Exception:
-                continue
+        deleted_ids = await _find_message_ids(prefix=prefix, contains=contains)
 
-            redis_client.delete(key)
-
-            with schedule_lock:
-                try:
-                    schedule.clear(message_id)
-                except ValueError:
-                    pass
-                scheduled_jobs.pop(message_id, None)
+        # Remove em lote (hash + índices): um round-trip por pipeline
+        for i in range(0, len(deleted_ids), REDIS_PIPELINE_CHUNK):
+            chunk = deleted_ids[i:i + REDIS_PIPELINE_CHUNK]
+            async with redis_client.pipeline(transaction=False) as pipe:
+                _delete_messages(pipe, chunk)
+                for message_id in chunk:
+                    pipe.publish(EVENTS_CHANNEL, f"del:{message_id}")
+                await pipe.execute()
 
-            deleted_ids.append(message_id)
+        for message_id in deleted_ids:
+            _cancel_job(message_id)
+            _get_cache.pop(message_id, None)
 
         return {"deleted": len(deleted_ids), "messageIds": deleted_ids}
     except HTTPException:
         raise
     except Exception as e:
-        log(f"Error in bulk_delete_messages: {type(e).__name__}: {str(e)}")
+        logger.error("Error in bulk_delete_messages: %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Failed to bulk delete messages: {str(e)}")
 
 
 @app.get("/messages/{message_id}")
 async def get_scheduled_message(message_id: str, token: str = Depends(verify_token)):
     try:
-        redis_key = f"message:{message_id}"
-        message_data_json = redis_client.get(redis_key)
+        cached = _get_cache.get(message_id)
+        if cached is not None:
+            return cached
 
-        if not message_data_json:
+        fields = await redis_client.hgetall(_message_key(message_id))
+
+        if not fields:
             raise HTTPException(status_code=404, detail=f"Message with ID '{message_id}' not found")
 
-        return json.loads(message_data_json)
+        data = _decode_message(fields)
+        _get_cache[message_id] = data
+        return data
 
     except HTTPException:
         raise
     except Exception as e:
-        log(f"Error in get_scheduled_message: {type(e).__name__}: {str(e)}")
+        logger.error("Error in get_scheduled_message: %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Failed to retrieve message: {str(e)}")
 
 
 @app.delete("/messages/{message_id}")
 async def delete_scheduled_message(message_id: str, token: str = Depends(verify_token)):
     try:
-        redis_key = f"message:{message_id}"
-        redis_client.delete(redis_key)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            _delete_messages(pipe, [message_id])
+            pipe.publish(EVENTS_CHANNEL, f"del:{message_id}")
+            await pipe.execute()
+        _get_cache.pop(message_id, None)
 
-        with schedule_lock:
-            try:
-                schedule.clear(message_id)
-            except ValueError:
-                log(f"No schedule found for ID: {message_id}")
-            scheduled_jobs.pop(message_id, None)
+        if not _cancel_job(message_id):
+            logger.info("No schedule found for ID: %s", message_id)
 
         return {"status": "deleted", "messageId": message_id}
 
     except Exception as e:
-        log(f"Error in delete: {type(e).__name__}: {str(e)}")
+        logger.error("Error in delete: %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Failed to delete message: {str(e)}")
 
 
 @app.get("/health")
 async def health_check():
     try:
-        redis_client.ping()
-        with schedule_lock:
-            job_count = len(schedule.jobs)
+        await redis_client.ping()
+        job_count = len(_jobs)
         return {
             "status": "healthy",
             "redis": "connected",
             "scheduledJobs": job_count,
+            "leader": _is_leader,
             "version": "2.0.0",
         }
     except Exception as e:
@@ -577,27 +1057,22 @@ async def stats(token: str = Depends(verify_token)):
         total_redis = 0
         failed_count = 0
         overdue_count = 0
-        now = datetime.utcnow()
+        now_ts = time.time()
 
-        for key in redis_client.scan_iter(match="message:*", count=1000):
+        async for _, fields in _iter_messages():
             total_redis += 1
-            raw = redis_client.get(key)
-            if raw:
-                data = json.loads(raw)
-                if data.get("_failCount"):
-                    failed_count += 1
-                schedule_to = data.get("scheduleTo")
-                if schedule_to:
-                    st = datetime.fromisoformat(schedule_to.replace('Z', '+00:00'))
-                    if st.astimezone().replace(tzinfo=None) <= now:
-                        overdue_count += 1
-
-        with schedule_lock:
-            job_count = len(schedule.jobs)
+            data = _decode_message(fields)
+            if data.get("_failCount"):
+                failed_count += 1
+            if data["scheduleTs"] <= now_ts:
+                overdue_count += 1
+
+        job_count = len(_jobs)
 
         return {
             "messagesInRedis": total_redis,
             "jobsInMemory": job_count,
+            "leader": _is_leader,
             "failedMessages": failed_count,
             "overdueMessages": overdue_count,
         }
@@ -606,5 +1081,6 @@ async def stats(token: str = Depends(verify_token)):
 
 
 if __name__ == "__main__":
-    log("Starting Scheduler API server v2.0.0")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    logger.info("Starting Scheduler API server v2.0.0")
+    # Com workers > 1 o uvicorn exige a app como string de import
+    uvicorn.run("scheduler_api:app", host="0.0.0.0", port=8000, workers=UVICORN_WORKERS)